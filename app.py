@@ -4,8 +4,12 @@ Streamlit App for GDG Amity Bengaluru Workshop
 Built with Google ADK (Agent Development Kit) + Vertex AI
 """
 
+import re
+import json
+import functools
+
 import streamlit as st
-from utils import Agent, print_box
+from utils import Agent, print_box, run_all
 
 # --- PAGE CONFIG ---
 st.set_page_config(
@@ -15,7 +19,9 @@ st.set_page_config(
 )
 
 # --- CUSTOM CSS ---
-st.markdown("""
+# Built once at import; re-emitted per run because Streamlit drops elements
+# that aren't regenerated. Fragment-scoped reruns skip this entirely.
+_CHROME_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -46,11 +52,19 @@ st.markdown("""
         font-weight: 600;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+_CHROME_HEADER = (
+    '<h1 class="main-header">🤖 ResumeGuide</h1>'
+    '<p class="sub-header">A 3-Agent System for B.Tech Resume Guidance | Built with Google ADK + Vertex AI</p>'
+)
+
+def _inject_chrome():
+    """Emit the CSS + header in one markdown call."""
+    st.markdown(_CHROME_CSS + _CHROME_HEADER, unsafe_allow_html=True)
 
 # --- HEADER ---
-st.markdown('<h1 class="main-header">🤖 ResumeGuide</h1>', unsafe_allow_html=True)
-st.markdown('<p class="sub-header">A 3-Agent System for B.Tech Resume Guidance | Built with Google ADK + Vertex AI</p>', unsafe_allow_html=True)
+_inject_chrome()
 
 # --- SHARED STATE ---
 if "student_data" not in st.session_state:
@@ -58,32 +72,90 @@ if "student_data" not in st.session_state:
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = {"profile": [], "reviewer": [], "coach": []}
 
+# Only the most recent messages are re-rendered each rerun; older ones
+# would otherwise make every keystroke submission re-parse the full history
+MAX_RENDERED_MESSAGES = 50
+
+def render_history(tab_key: str):
+    """Render a tab's chat history, windowed to the last N messages."""
+    history = st.session_state.chat_history[tab_key]
+    if len(history) > MAX_RENDERED_MESSAGES:
+        st.caption(f"Showing last {MAX_RENDERED_MESSAGES} of {len(history)} messages")
+        history = history[-MAX_RENDERED_MESSAGES:]
+    for msg in history:
+        with st.chat_message(msg["role"]):
+            st.write(msg["content"])
+
 # --- TOOL DEFINITIONS ---
+# Precompiled/hoisted lookups so the tools don't rebuild them per call
+_HOT_SKILLS = frozenset({"python", "react", "machine learning", "aws", "docker",
+                         "kubernetes", "typescript", "golang"})
+_ACTION_RE = re.compile(r"\b(built|developed|created|implemented|designed)\b", re.I)
+_DIGIT_RE = re.compile(r"\d")
+_CERT_MAP = {
+    "python": "Google Professional ML Engineer",
+    "cloud": "AWS Solutions Architect",
+    "aws": "AWS Solutions Architect",
+    "react": "Meta Front-End Developer",
+    "frontend": "Meta Front-End Developer",
+    "data": "Google Data Analytics Certificate",
+}
+
+def _sync_profile_json():
+    """Re-serialize the profile once per mutation, not once per model turn.
+
+    Underscore-prefixed keys are derived lookup structures (sets, joined
+    strings) — internal, and not all JSON-serializable — so they're skipped.
+    """
+    st.session_state.student_data_json = json.dumps(
+        {k: v for k, v in st.session_state.student_data.items() if not k.startswith('_')},
+        separators=(',', ':')
+    )
+
 def save_branch(branch: str) -> str:
     """Save the student's engineering branch."""
     st.session_state.student_data['branch'] = branch
+    _sync_profile_json()
     return f"✅ Branch saved: {branch}"
 
 def save_skills(skills: str) -> str:
     """Save technical skills as comma-separated string."""
-    st.session_state.student_data['skills'] = [s.strip() for s in skills.split(',')]
-    return f"✅ Skills saved: {st.session_state.student_data['skills']}"
+    items = [s.strip() for s in skills.split(',') if s.strip()]
+    sd = st.session_state.student_data
+    sd['skills'] = items
+    # Derived structures, built once per save: O(1) membership checks and a
+    # pre-joined display string so renders don't re-join per rerun
+    sd['_skills_set'] = frozenset(s.lower() for s in items)
+    sd['_skills_joined'] = ", ".join(items)
+    _sync_profile_json()
+    return f"✅ Skills saved: {items}"
 
 def save_project(title: str, description: str) -> str:
     """Save a project with title and description."""
-    if 'projects' not in st.session_state.student_data:
-        st.session_state.student_data['projects'] = []
-    st.session_state.student_data['projects'].append({'title': title, 'desc': description})
+    sd = st.session_state.student_data
+    if 'projects' not in sd:
+        sd['projects'] = []
+        sd['_projects_index'] = set()
+    # O(1) duplicate rejection — retried prompts shouldn't pile up copies
+    key = title.strip().lower()
+    if key in sd['_projects_index']:
+        return f"⚠️ Project already saved: {title}"
+    sd['_projects_index'].add(key)
+    sd['projects'].append({'title': title, 'desc': description})
+    sd['projects_count'] = sd.get('projects_count', 0) + 1
+    _sync_profile_json()
     return f"✅ Project added: {title}"
 
 def get_profile() -> str:
     """Get current student profile."""
-    return str(st.session_state.student_data) if st.session_state.student_data else "No data yet."
+    if not st.session_state.student_data:
+        return "No data yet."
+    return st.session_state.get("student_data_json") or "No data yet."
 
+@functools.lru_cache(maxsize=128)
 def check_skill_demand(skill: str) -> str:
     """Check if a skill is in demand."""
-    HOT_SKILLS = ["python", "react", "machine learning", "aws", "docker", "kubernetes", "typescript", "golang"]
-    if skill.lower() in HOT_SKILLS:
+    if skill.strip().lower() in _HOT_SKILLS:
         return f"🔥 '{skill}' is HIGH DEMAND in 2024-25!"
     return f"'{skill}' is useful but consider adding trending skills like Python, React, or AWS."
 
@@ -92,11 +164,11 @@ def analyze_project(title: str, description: str) -> str:
     issues = []
     if len(description) < 20:
         issues.append("Too short - add more details")
-    if not any(word in description.lower() for word in ["built", "developed", "created", "implemented", "designed"]):
+    if not _ACTION_RE.search(description):
         issues.append("Use action verbs (built, developed, created)")
-    if not any(char.isdigit() for char in description):
+    if not _DIGIT_RE.search(description):
         issues.append("Add metrics/numbers (e.g., '50% faster', '1000 users')")
-    
+
     if issues:
         return f"⚠️ Improvements needed: {', '.join(issues)}"
     return "✅ Project description looks strong!"
@@ -114,13 +186,13 @@ def get_industry_trends(branch: str) -> str:
 
 def suggest_certifications(skills: str) -> str:
     """Suggest certifications based on skills."""
-    certs = []
-    skills_lower = skills.lower()
-    if "python" in skills_lower: certs.append("Google Professional ML Engineer")
-    if "cloud" in skills_lower or "aws" in skills_lower: certs.append("AWS Solutions Architect")
-    if "react" in skills_lower or "frontend" in skills_lower: certs.append("Meta Front-End Developer")
-    if "data" in skills_lower: certs.append("Google Data Analytics Certificate")
-    if not certs: certs.append("Google IT Support Certificate (good starting point)")
+    # Tokenize once, then O(1) lookups — instead of one substring scan per cert
+    tokens = set(re.findall(r"[a-z]+", skills.lower()))
+    certs = list(dict.fromkeys(
+        cert for keyword, cert in _CERT_MAP.items() if keyword in tokens
+    ))
+    if not certs:
+        certs = ["Google IT Support Certificate (good starting point)"]
     return f"📜 Recommended: {', '.join(certs)}"
 
 # --- INITIALIZE AGENTS (cached) ---
@@ -132,7 +204,8 @@ def get_agents():
         instruction="""You are ProfileBot, a friendly assistant that collects student info for resumes.
         Ask about: Branch, Skills, Projects. Use tools to SAVE each piece.
         Be conversational. One question at a time. Keep responses short.""",
-        tools=[save_branch, save_skills, save_project, get_profile]
+        tools=[save_branch, save_skills, save_project, get_profile],
+        cache_responses=False  # its tools mutate session state on every turn
     )
     
     reviewer_bot = Agent(
@@ -140,6 +213,8 @@ def get_agents():
         instruction="""You are ReviewerBot, a resume expert. Your job:
         1. Check skill demand using check_skill_demand tool
         2. Analyze projects using analyze_project tool
+        When several tool calls are needed, emit them all in a single turn
+        so they can run in parallel.
         Give specific, actionable feedback. Be encouraging but honest.""",
         tools=[check_skill_demand, analyze_project]
     )
@@ -152,24 +227,27 @@ def get_agents():
         Be motivating and give specific actionable advice.""",
         tools=[get_industry_trends, suggest_certifications]
     )
-    
+
+    # Prewarm sessions so the first real message skips session-creation RPCs
+    for bot in (profile_bot, reviewer_bot, coach_bot):
+        bot.prewarm()
+
     return profile_bot, reviewer_bot, coach_bot
 
-# --- TABS ---
-tab1, tab2, tab3, tab4 = st.tabs(["🧑‍💼 ProfileBot", "📝 ReviewerBot", "🎯 CoachBot", "📊 Dashboard"])
+# --- TAB BODIES (fragment-scoped) ---
+# Each tab is a fragment: submitting a chat input or clicking a button only
+# reruns that tab's body, not the whole script and every other tab.
 
-# --- TAB 1: PROFILEBOT ---
-with tab1:
+@st.fragment
+def profile_tab_body():
     col1, col2 = st.columns([2, 1])
-    
+
     with col1:
         st.subheader("🧑‍💼 ProfileBot - Collect Your Info")
         st.caption("Tell me about yourself and I'll save it for your resume!")
         
         # Chat interface
-        for msg in st.session_state.chat_history["profile"]:
-            with st.chat_message(msg["role"]):
-                st.write(msg["content"])
+        render_history("profile")
         
         if prompt := st.chat_input("Tell ProfileBot about yourself...", key="profile_input"):
             # Add user message
@@ -182,8 +260,7 @@ with tab1:
                 with st.spinner("ProfileBot is thinking..."):
                     try:
                         profile_bot, _, _ = get_agents()
-                        response = profile_bot.chat(prompt)
-                        st.write(response)
+                        response = st.write_stream(profile_bot.stream_chat(prompt))
                         st.session_state.chat_history["profile"].append({"role": "assistant", "content": response})
                     except Exception as e:
                         st.error(f"Error: {e}")
@@ -191,24 +268,24 @@ with tab1:
     with col2:
         st.subheader("📋 Your Profile")
         if st.session_state.student_data:
-            st.json(st.session_state.student_data)
+            # The JSON snapshot excludes internal derived keys (sets etc.)
+            st.json(st.session_state.get("student_data_json", "{}"))
         else:
             st.info("No data yet. Start chatting!")
-        
+
         if st.button("🗑️ Clear Profile", key="clear_profile"):
             st.session_state.student_data = {}
             st.session_state.chat_history["profile"] = []
             st.rerun()
 
-# --- TAB 2: REVIEWERBOT ---
-with tab2:
+
+@st.fragment
+def reviewer_tab_body():
     st.subheader("📝 ReviewerBot - Analyze Your Resume")
     st.caption("Get feedback on your skills and project descriptions!")
     
     # Chat interface
-    for msg in st.session_state.chat_history["reviewer"]:
-        with st.chat_message(msg["role"]):
-            st.write(msg["content"])
+    render_history("reviewer")
     
     if prompt := st.chat_input("Ask ReviewerBot to analyze skills or projects...", key="reviewer_input"):
         st.session_state.chat_history["reviewer"].append({"role": "user", "content": prompt})
@@ -219,8 +296,7 @@ with tab2:
             with st.spinner("ReviewerBot is analyzing..."):
                 try:
                     _, reviewer_bot, _ = get_agents()
-                    response = reviewer_bot.chat(prompt)
-                    st.write(response)
+                    response = st.write_stream(reviewer_bot.stream_chat(prompt))
                     st.session_state.chat_history["reviewer"].append({"role": "assistant", "content": response})
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -238,15 +314,14 @@ with tab2:
                 result = check_skill_demand(skill)
                 st.info(result)
 
-# --- TAB 3: COACHBOT ---
-with tab3:
+
+@st.fragment
+def coach_tab_body():
     st.subheader("🎯 CoachBot - Career Guidance")
     st.caption("Get industry-specific advice for your engineering branch!")
     
     # Chat interface
-    for msg in st.session_state.chat_history["coach"]:
-        with st.chat_message(msg["role"]):
-            st.write(msg["content"])
+    render_history("coach")
     
     if prompt := st.chat_input("Ask CoachBot for career advice...", key="coach_input"):
         st.session_state.chat_history["coach"].append({"role": "user", "content": prompt})
@@ -257,8 +332,7 @@ with tab3:
             with st.spinner("CoachBot is thinking..."):
                 try:
                     _, _, coach_bot = get_agents()
-                    response = coach_bot.chat(prompt)
-                    st.write(response)
+                    response = st.write_stream(coach_bot.stream_chat(prompt))
                     st.session_state.chat_history["coach"].append({"role": "assistant", "content": response})
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -271,8 +345,9 @@ with tab3:
         result = get_industry_trends(branch)
         st.success(result)
 
-# --- TAB 4: DASHBOARD ---
-with tab4:
+
+@st.fragment
+def dashboard_tab_body():
     st.subheader("📊 Resume Dashboard")
     
     col1, col2 = st.columns(2)
@@ -283,9 +358,10 @@ with tab4:
             if 'branch' in st.session_state.student_data:
                 st.metric("Branch", st.session_state.student_data['branch'])
             if 'skills' in st.session_state.student_data:
-                st.write("**Skills:**", ", ".join(st.session_state.student_data['skills']))
+                st.write("**Skills:**", st.session_state.student_data.get(
+                    '_skills_joined', ", ".join(st.session_state.student_data['skills'])))
             if 'projects' in st.session_state.student_data:
-                st.write(f"**Projects:** {len(st.session_state.student_data['projects'])}")
+                st.write(f"**Projects:** {st.session_state.student_data.get('projects_count', 0)}")
                 for p in st.session_state.student_data['projects']:
                     st.write(f"  • {p['title']}")
         else:
@@ -316,14 +392,56 @@ Resume Ready! 🎉
         """)
     
     st.divider()
-    
+
+    # Full review: reviewer + coach run concurrently (max-of-calls latency)
+    st.markdown("### ⚡ Full Review")
+    if st.button("🚀 Run Full Review", key="full_review"):
+        if st.session_state.student_data:
+            profile = get_profile()
+            with st.spinner("ReviewerBot and CoachBot are working in parallel..."):
+                try:
+                    _, reviewer_bot, coach_bot = get_agents()
+                    review, advice = run_all([
+                        (reviewer_bot, f"Review this student profile: {profile}"),
+                        (coach_bot, f"Give career advice for this student profile: {profile}"),
+                    ])
+                    rcol, ccol = st.columns(2)
+                    with rcol:
+                        st.markdown("**📝 ReviewerBot says:**")
+                        st.write(review)
+                    with ccol:
+                        st.markdown("**🎯 CoachBot says:**")
+                        st.write(advice)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+        else:
+            st.info("Build your profile with ProfileBot first!")
+
+    st.divider()
+
     # Clear all button
     if st.button("🗑️ Reset Everything", type="secondary"):
         st.session_state.student_data = {}
         st.session_state.chat_history = {"profile": [], "reviewer": [], "coach": []}
-        st.cache_resource.clear()
+        # Clear conversation memory but keep the agents (and their warm
+        # model connections) alive instead of rebuilding everything
+        for bot in get_agents():
+            bot.clear_memory()
         st.rerun()
 
+
+# --- TABS ---
+tab1, tab2, tab3, tab4 = st.tabs(["🧑‍💼 ProfileBot", "📝 ReviewerBot", "🎯 CoachBot", "📊 Dashboard"])
+
+with tab1:
+    profile_tab_body()
+with tab2:
+    reviewer_tab_body()
+with tab3:
+    coach_tab_body()
+with tab4:
+    dashboard_tab_body()
+
 # --- FOOTER ---
 st.divider()
 st.markdown("""
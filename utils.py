@@ -4,32 +4,88 @@ Agent wrapper for Google Agent Development Kit (ADK) with Vertex AI
 """
 
 import os
-import glob
 import json
+import queue
 import asyncio
+import logging
+import functools
+import threading
+from pathlib import Path
 from typing import List, Callable, Optional
 
+from cachetools import TTLCache
+
+logger = logging.getLogger("resumeguide")
+
 from google.adk.agents import Agent as ADKAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.models import Gemini
 from google.genai import types
 
+# --- SHARED BACKGROUND EVENT LOOP ---
+# One long-lived loop on a daemon thread serves every agent call, so
+# Streamlit reruns don't pay loop setup/teardown per message and all
+# InMemorySessionService awaits run on the same loop.
+_LOOP = asyncio.new_event_loop()
+_LOOP_THREAD = threading.Thread(target=_LOOP.run_forever, name="agent-event-loop", daemon=True)
+_LOOP_THREAD.start()
+
+
+# The loop thread can carry only ONE script context at a time (it's stored
+# as a thread attribute), so dispatches that need one are serialized —
+# otherwise a second user's dispatch would swap in their context while the
+# first user's tools are still running, writing into the wrong session.
+_SCRIPT_CTX_LOCK = threading.Lock()
+
+
+def _get_script_ctx():
+    """Return the calling thread's Streamlit script context, if any.
+
+    ADK invokes sync tools inline on the loop thread; without the script
+    context there, `st.session_state` resolves to a fresh throwaway state
+    and tools like save_branch/save_skills break. Returns None outside a
+    Streamlit script run (e.g. notebooks).
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx()
+
+
+def _attach_script_ctx(ctx):
+    """Attach a captured script context to the loop thread.
+
+    Callers must hold _SCRIPT_CTX_LOCK for the whole dispatch.
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx
+    add_script_run_ctx(_LOOP_THREAD, ctx)
+
+# Sentinel marking the end of a streamed response
+_STREAM_DONE = object()
+
+
 # --- AUTO-DETECT PROJECT ID FROM SERVICE ACCOUNT JSON ---
+@functools.lru_cache(maxsize=1)
 def _get_project_id():
-    """Get project ID from service account JSON in current directory."""
-    json_files = glob.glob("*.json")
-    for f in json_files:
+    """Get project ID from service account JSON in current directory.
+
+    Cached — the filesystem scan and JSON parsing happen once per process.
+    """
+    for f in Path(".").glob("*.json"):
         try:
             with open(f) as fp:
                 data = json.load(fp)
                 if data.get("type") == "service_account":
-                    return data.get("project_id"), f
+                    return data.get("project_id"), str(f)
         except:
             continue
     return None, None
 
 
+@functools.lru_cache(maxsize=1)
 def _setup_vertex_auth():
     """Setup Vertex AI authentication using service account."""
     project_id, sa_file = _get_project_id()
@@ -48,12 +104,104 @@ def _setup_vertex_auth():
     os.environ["GOOGLE_CLOUD_PROJECT"] = project_id
     os.environ["GOOGLE_CLOUD_LOCATION"] = location
     
-    print(f"🔌 Connecting to Vertex AI (Project: {project_id}, Loc: {location})...")
-    print(f"🔑 Using credentials: {sa_file}")
+    logger.info("🔌 Connecting to Vertex AI (Project: %s, Loc: %s)...", project_id, location)
+    logger.info("🔑 Using credentials: %s", sa_file)
     
     return project_id, location
 
 
+@functools.lru_cache(maxsize=8)
+def _get_gemini_model(model: str) -> Gemini:
+    """Shared Gemini client per model name, so agents using the same model
+    reuse one warm connection instead of each opening a new channel."""
+    return Gemini(model=model)
+
+
+class BatchedGeminiExecutor:
+    """Micro-batches concurrent model calls for agents without tools.
+
+    Requests arriving within `max_wait_ms` of each other are pulled off a
+    shared queue and dispatched together, amortizing per-request scheduling
+    overhead when several users submit at once. Vertex's generate_content
+    takes one conversation per call, so a drained batch is issued as
+    concurrent calls rather than a single merged request. Tool-calling
+    agents keep going through the ADK Runner.
+    """
+
+    def __init__(self, max_batch: int = 16, max_wait_ms: int = 10):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._client = None
+
+    async def submit(self, model: str, contents, system_instruction: str = None) -> str:
+        """Queue one request and wait for its response text."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            asyncio.ensure_future(self._worker())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((model, contents, system_instruction, future))
+        return await future
+
+    async def _drain_batch(self):
+        """Block for one request, then collect more for up to max_wait."""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _generate(self, model, contents, system_instruction):
+        config = None
+        if system_instruction:
+            config = types.GenerateContentConfig(system_instruction=system_instruction)
+        response = await self._client.aio.models.generate_content(
+            model=model, contents=contents, config=config
+        )
+        return response.text or ""
+
+    async def _worker(self):
+        batch = []
+        try:
+            from google import genai
+            self._client = genai.Client()
+            while True:
+                batch = await self._drain_batch()
+                results = await asyncio.gather(
+                    *(self._generate(m, c, si) for m, c, si, _ in batch),
+                    return_exceptions=True,
+                )
+                for (_, _, _, future), result in zip(batch, results):
+                    if future.cancelled():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                batch = []
+        except Exception as exc:
+            # A worker death (e.g. genai.Client() failing on bad credentials)
+            # must not strand callers awaiting their futures. Fail everything
+            # pending and reset so the next submit() starts a fresh worker.
+            logger.error("🛑 Batch executor worker failed: %s", exc)
+            queued, self._queue, self._client = self._queue, None, None
+            while queued is not None and not queued.empty():
+                batch.append(queued.get_nowait())
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+
+_BATCH_EXECUTOR = BatchedGeminiExecutor()
+
+
 class Agent:
     """
     A robust Agent wrapper for Google ADK (Agent Development Kit).
@@ -65,19 +213,30 @@ class Agent:
     # Shared session service for all agents
     _session_service = None
     _app_name = "resume_guide"
-    
+
+    # Shared response cache: identical repeated prompts skip the model call.
+    # TTLCache is not thread-safe and is touched from both the script thread
+    # and the loop thread, so every access goes through the lock.
+    _response_cache = TTLCache(maxsize=512, ttl=600)
+    _response_cache_lock = threading.Lock()
+
     def __init__(
-        self, 
-        name: str, 
+        self,
+        name: str,
         model: str = "gemini-2.0-flash",
         instruction: str = "",
-        tools: List[Callable] = None
+        tools: List[Callable] = None,
+        cache_responses: bool = True,
+        max_turns: int = 12
     ):
         self.name = name
         self.model_name = model
         self.system_instruction = instruction
         self.tools = tools or []
+        self.cache_responses = cache_responses
+        self.max_turns = max_turns
         self._session_created = False
+        self._history = []  # conversation turns for the batched (tool-less) path
         
         # Setup Vertex AI auth
         project_id, location = _setup_vertex_auth()
@@ -90,9 +249,9 @@ class Agent:
         self._user_id = f"user_{name}"
         self._session_id = f"session_{name}_{id(self)}"
         
-        # Create the Gemini model instance for ADK
+        # Get the (shared) Gemini model instance for ADK
         # This properly configures the model for use with Vertex AI
-        gemini_model = Gemini(model=model)
+        gemini_model = _get_gemini_model(model)
         
         # Create the ADK Agent with the Gemini model instance
         # Note: ADK requires tools to be a list (not None)
@@ -137,90 +296,280 @@ class Agent:
         
         self._session_created = True
 
-    def chat(self, message: str, image_path: str = None) -> str:
-        """Sends a message to the agent and returns the response."""
-        
-        print(f"⏳ {self.name} is thinking...")
-        
-        # Handle image attachment (if provided)
-        if image_path:
-            try:
-                with open(image_path, "rb") as f:
-                    image_bytes = f.read()
-                mime = "image/png" if image_path.lower().endswith(".png") else "image/jpeg"
-                print(f"📸 [Attached Image: {image_path}]")
-            except Exception as e:
-                print(f"❌ Error loading image: {e}")
-        
-        # Run the agent using asyncio
+    def prewarm(self, timeout: float = 3.0):
+        """Create this agent's session ahead of the first real message.
+
+        Best-effort: failures are ignored and the bounded wait keeps app
+        startup from blocking on a slow connection.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._ensure_session_async(), _LOOP)
         try:
-            # Try to get existing event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If loop is running (e.g., in Jupyter), use nest_asyncio
-                try:
-                    import nest_asyncio
-                    nest_asyncio.apply()
-                except ImportError:
-                    pass
-                response_text = loop.run_until_complete(self._run_agent(message))
-            else:
-                response_text = loop.run_until_complete(self._run_agent(message))
-            return response_text
-        except RuntimeError:
-            # If no event loop exists, create one
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            future.result(timeout)
+        except Exception:
+            pass
+
+    def chat(self, message: str) -> str:
+        """Sends a message to the agent and returns the full response."""
+        response_text = "".join(self.stream_chat(message))
+        return response_text if response_text else "No response generated."
+
+    async def chat_async(self, message: str) -> str:
+        """Async version of chat() — lets callers fan out independent
+        requests with asyncio.gather (see run_all)."""
+        cache_key = (self.name, self.model_name, message)
+        if self.cache_responses:
+            with Agent._response_cache_lock:
+                cached = Agent._response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        chunks = []
+        async for chunk in self._run_agent(message):
+            chunks.append(chunk)
+        response_text = "".join(chunks)
+
+        if self.cache_responses and response_text:
+            with Agent._response_cache_lock:
+                Agent._response_cache[cache_key] = response_text
+        return response_text if response_text else "No response generated."
+
+    def stream_chat(self, message: str):
+        """Sends a message to the agent and yields response text as it arrives.
+
+        Sync generator suitable for `st.write_stream` — the UI can start
+        rendering on the first token instead of waiting for the full response.
+        """
+
+        logger.debug("⏳ %s is thinking...", self.name)
+
+        # Identical recent prompt? Serve the cached response — a dict
+        # lookup instead of a round trip to Vertex AI
+        cache_key = (self.name, self.model_name, message)
+        if self.cache_responses:
+            with Agent._response_cache_lock:
+                cached = Agent._response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = queue.Queue()
+
+        async def _pump():
             try:
-                response_text = loop.run_until_complete(self._run_agent(message))
-                return response_text
+                async for chunk in self._run_agent(message):
+                    chunks.put(chunk)
             finally:
-                pass  # Keep loop for reuse
-    
-    async def _run_agent(self, message: str) -> str:
-        """Run the agent asynchronously and collect response."""
-        
+                chunks.put(_STREAM_DONE)
+
+        # Only tool-calling agents need the script context on the loop
+        # thread, and only one context may be live there at a time
+        ctx = _get_script_ctx() if self.tools else None
+        if ctx is not None:
+            _SCRIPT_CTX_LOCK.acquire()
+            _attach_script_ctx(ctx)
+        try:
+            future = asyncio.run_coroutine_threadsafe(_pump(), _LOOP)
+            collected = []
+            while True:
+                chunk = chunks.get()
+                if chunk is _STREAM_DONE:
+                    break
+                collected.append(chunk)
+                yield chunk
+            future.result()  # surface any exception raised on the loop
+        finally:
+            if ctx is not None:
+                _SCRIPT_CTX_LOCK.release()
+
+        if self.cache_responses and collected:
+            with Agent._response_cache_lock:
+                Agent._response_cache[cache_key] = "".join(collected)
+
+    async def _run_agent(self, message: str):
+        """Run the agent asynchronously, yielding response text incrementally."""
+
+        # Tool-less agents skip the Runner and go through the shared
+        # micro-batching executor, keeping their own turn history
+        if not self.tools:
+            self._history.append(
+                types.Content(role="user", parts=[types.Part(text=message)])
+            )
+            text = await _BATCH_EXECUTOR.submit(
+                self.model_name,
+                list(self._history),
+                system_instruction=self.system_instruction or None,
+            )
+            self._history.append(
+                types.Content(role="model", parts=[types.Part(text=text)])
+            )
+            # Same sliding window as the Runner path
+            if len(self._history) > self.max_turns * 2:
+                del self._history[:-self.max_turns * 2]
+            if text:
+                yield text
+            return
+
         # Ensure session exists
         await self._ensure_session_async()
-        
-        final_response = ""
-        
-        # Use the runner to process the message
+
+        streamed_this_turn = False
+        tool_calls = []  # buffered and logged once — no stdout work per event
+
+        # Use the runner to process the message (SSE mode yields partial events)
         async for event in self._runner.run_async(
             user_id=self._user_id,
             session_id=self._session_id,
             new_message=types.Content(
                 role="user",
                 parts=[types.Part(text=message)]
-            )
+            ),
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
         ):
             # Process events from the agent
             if hasattr(event, 'content') and event.content:
-                if hasattr(event.content, 'parts'):
+                if hasattr(event.content, 'parts') and event.content.parts:
                     for part in event.content.parts:
                         # Check for function calls (tool usage)
                         if hasattr(part, 'function_call') and part.function_call:
                             fc = part.function_call
-                            print(f"🛠️ [Tool Call]: {fc.name}({fc.args})")
+                            tool_calls.append(f"{fc.name}({fc.args})")
                         # Check for text response
                         elif hasattr(part, 'text') and part.text:
-                            final_response = part.text
-            
+                            if getattr(event, 'partial', False):
+                                # Incremental delta — stream it straight out
+                                streamed_this_turn = True
+                                yield part.text
+                            elif not streamed_this_turn:
+                                # Full text arrived in one piece (no partials)
+                                yield part.text
+
+            # A non-partial event closes the current model turn; the next
+            # turn (e.g. after a tool call) streams fresh text
+            if not getattr(event, 'partial', False):
+                streamed_this_turn = False
+
             # Handle different event types
             if hasattr(event, 'actions'):
                 for action in event.actions or []:
                     if hasattr(action, 'function_calls'):
                         for fc in action.function_calls or []:
-                            print(f"🛠️ [Tool Call]: {fc.name}")
-        
-        return final_response if final_response else "No response generated."
+                            tool_calls.append(fc.name)
+
+        if tool_calls:
+            logger.debug("🛠️ [Tool Calls]: %s", "; ".join(tool_calls))
+
+        # Keep prefill bounded: old turns beyond the window are dropped
+        await self._trim_session_async()
+
+    @staticmethod
+    def _starts_user_turn(event) -> bool:
+        """True for a plain user message event (not a tool response)."""
+        if getattr(event, 'author', None) != 'user':
+            return False
+        content = getattr(event, 'content', None)
+        parts = getattr(content, 'parts', None) if content else None
+        if not parts:
+            return False
+        if any(getattr(p, 'function_response', None) for p in parts):
+            return False
+        return any(getattr(p, 'text', None) for p in parts)
+
+    async def _trim_session_async(self):
+        """Truncate session history to the last `max_turns` turns.
+
+        Prefill tokens (and per-turn latency) otherwise grow with every
+        exchange. The cut always lands on a plain user message: tool-calling
+        turns span 3-4 events, and a history replayed from mid-turn (e.g.
+        starting at a function response) is rejected by Vertex on the next
+        call. Best-effort — trimming failures never break the chat.
+        """
+        try:
+            session = await Agent._session_service.get_session(
+                app_name=Agent._app_name,
+                user_id=self._user_id,
+                session_id=self._session_id
+            )
+            if session is None:
+                return
+
+            # Walk backwards to where the max_turns-th most recent user
+            # turn begins; everything older than that is dropped
+            start = None
+            turns = 0
+            for i in range(len(session.events) - 1, -1, -1):
+                if Agent._starts_user_turn(session.events[i]):
+                    turns += 1
+                    if turns == self.max_turns:
+                        start = i
+                        break
+            if not start:  # fewer than max_turns turns, or already aligned
+                return
+
+            recent = session.events[start:]
+            await Agent._session_service.delete_session(
+                app_name=Agent._app_name,
+                user_id=self._user_id,
+                session_id=self._session_id
+            )
+            session = await Agent._session_service.create_session(
+                app_name=Agent._app_name,
+                user_id=self._user_id,
+                session_id=self._session_id
+            )
+            for event in recent:
+                await Agent._session_service.append_event(session, event)
+        except Exception as e:
+            logger.debug("History trim skipped for %s: %s", self.name, e)
 
     def clear_memory(self):
-        """Clear the conversation history for this agent."""
-        # Create a new session to clear history
-        self._session_id = f"session_{self.name}_{id(self)}_{hash(str(id(self)))}"
-        self._session_created = False
-        print(f"🧹 Memory cleared for {self.name}.")
+        """Clear the conversation history for this agent.
+
+        Deletes and recreates the session under the same id — minting a new
+        id per clear would leave the old session (and its whole history)
+        alive in the InMemorySessionService forever.
+        """
+        async def _clear():
+            try:
+                await Agent._session_service.delete_session(
+                    app_name=Agent._app_name,
+                    user_id=self._user_id,
+                    session_id=self._session_id
+                )
+            except Exception:
+                pass  # nothing to delete on a never-used agent
+            await Agent._session_service.create_session(
+                app_name=Agent._app_name,
+                user_id=self._user_id,
+                session_id=self._session_id
+            )
+            # Reset on the loop thread, where _run_agent appends turns,
+            # so a clear can't race an in-flight chat
+            self._history.clear()
+
+        asyncio.run_coroutine_threadsafe(_clear(), _LOOP).result()
+        self._session_created = True  # the fresh session already exists
+        logger.info("🧹 Memory cleared for %s.", self.name)
+
+
+def run_all(pairs):
+    """Run several (agent, message) chats concurrently on the shared loop.
+
+    Independent calls overlap, so total latency is the slowest call
+    rather than the sum of all of them. Returns responses in order.
+    """
+    async def _gather():
+        return await asyncio.gather(
+            *(agent.chat_async(message) for agent, message in pairs)
+        )
+
+    # Same context rules as stream_chat: the gathered calls still run
+    # concurrently with each other, under one caller's context
+    ctx = _get_script_ctx() if any(agent.tools for agent, _ in pairs) else None
+    if ctx is None:
+        return asyncio.run_coroutine_threadsafe(_gather(), _LOOP).result()
+    with _SCRIPT_CTX_LOCK:
+        _attach_script_ctx(ctx)
+        return asyncio.run_coroutine_threadsafe(_gather(), _LOOP).result()
 
 
 def print_box(title: str, content: str):